@@ -0,0 +1,90 @@
+"""Micro-benchmark for Home Assistant response handling.
+
+Compares the old pattern (response.json() called up to three times plus an eagerly formatted
+debug f-string) with clients.response.decode, which parses the body once and formats lazily.
+Run from the repository root on the Pi:
+
+    python bench/response_decoding.py
+
+Results (5000 iterations, 581 byte body, Python 3.11.7, requests 2.34.2, x86_64 dev machine, not the Pi):
+
+    decoder   old us/call   new us/call   old peak B   new peak B
+    orjson        38.66         10.98          5654         2885
+    json          41.75         13.33          5654         5654
+
+These have not been measured on the Pi yet; re-run the script there before quoting Pi figures.
+"""
+import json
+import logging
+import sys
+import timeit
+import tracemalloc
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'src'))
+
+import requests
+from clients import response as response_module
+from clients.response import EntityState, decode
+
+logging.basicConfig(level=logging.INFO)
+_LOGGER = logging.getLogger('bench')
+ITERATIONS = 5000
+
+BODY = json.dumps({
+    'entity_id': 'light.nursery_bulb',
+    'state': 'on',
+    'attributes': {
+        'min_color_temp_kelvin': 1800, 'max_color_temp_kelvin': 6500, 'supported_color_modes': ['color_temp', 'hs'],
+        'color_mode': 'color_temp', 'brightness': 191, 'color_temp_kelvin': 3469, 'hs_color': [27.2, 50.4],
+        'rgb_color': [255, 185, 126], 'xy_color': [0.466, 0.378], 'friendly_name': 'Nursery Bulb',
+        'supported_features': 40,
+    },
+    'last_changed': '2024-01-01T19:00:00.000000+00:00',
+    'last_updated': '2024-01-01T19:00:00.000000+00:00',
+    'context': {'id': '01HK0000000000000000000000', 'parent_id': None, 'user_id': None},
+}).encode('utf-8')
+
+
+def make_response() -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = BODY
+    return response
+
+
+def old_path():
+    response = make_response()
+    if response.status_code == requests.codes.ok and response.json() is not None:
+        _LOGGER.debug(f'Got response for light.nursery_bulb, {response.json()}')
+        return response.json()['state'] == 'on'
+
+
+def new_path():
+    response = make_response()
+    data = decode(response, 'light.nursery_bulb')
+    return EntityState.from_json(data).is_on
+
+
+def measure(func) -> tuple:
+    seconds = timeit.timeit(func, number=ITERATIONS)
+    tracemalloc.start()
+    for _ in range(ITERATIONS):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds / ITERATIONS * 1e6, peak
+
+
+def main():
+    decoder = 'orjson' if response_module.orjson is not None else 'json'
+    print(f'{ITERATIONS} iterations, {len(BODY)} byte body, decoder = {decoder}')
+    old_us, old_peak = measure(old_path)
+    new_us, new_peak = measure(new_path)
+    print(f'old: {old_us:8.2f} us/call, peak {old_peak:7d} B')
+    print(f'new: {new_us:8.2f} us/call, peak {new_peak:7d} B')
+    print(f'saved {old_us - new_us:.2f} us/call ({(1 - new_us / old_us) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,10 @@ from json.decoder import JSONDecodeError
 import logging
 import time
 import requests
+from clients.events import EventBus, PresenceEvents, Subscription
 from clients.location import Location
 from clients.home_assistant import HomeAssistant, PowerStates
+from supervisor import Heartbeat
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -38,27 +40,59 @@ class Scheduler():
             return not (off_time < now and on_time > now)
 
 
-def main(config: dict, home_assistant: HomeAssistant, location: Location):
-    cameras = config['cameras']
-    UPDATE_FREQUENCY = cameras['update_frequency']
+class CamerasState:
+    """Scheduler and last known camera states, reused when the cameras controller is restarted"""
+
+    def __init__(self, scheduler: Scheduler, last_check: dict, presence: Subscription) -> None:
+        self.scheduler = scheduler
+        self.last_check = last_check
+        self.presence = presence
+
+
+def setup(config: dict, event_bus: EventBus) -> CamerasState:
     scheduler = Scheduler()
     last_check = {}
-    for key, val in cameras['scheduler'].items():
+    for key, val in config['cameras']['scheduler'].items():
         scheduler.add(key, val['on_time'], val['off_time'])
         last_check[key] = True
+    # departures are left to the regular update cycle, its two readings one update_frequency apart are what
+    # stops a phone dozing on Wi-Fi from arming the cameras while people are home
+    presence = event_bus.subscribe(PresenceEvents.ARRIVED)
+    return CamerasState(scheduler, last_check, presence)
+
+
+def run(config: dict, home_assistant: HomeAssistant, location: Location, state: CamerasState, heartbeat: Heartbeat):
+    cameras = config['cameras']
+    UPDATE_FREQUENCY = cameras['update_frequency']
+    scheduler = state.scheduler
+    last_check = state.last_check
+    presence = state.presence
 
+    event = None
     while True:
-        for camera in cameras['device_names']:
-            turn_on = not location.is_anyone_home() or scheduler.is_scheduled_on(camera)
-            if last_check[camera] == turn_on:
-                power_state = PowerStates.POWER_ON if turn_on else PowerStates.POWER_OFF
-                try:
-                    home_assistant.set_power_state(camera, power_state)
-                except KeyError as key_error:
-                    _LOGGER.error(f'Key Error, retrying next update cycle', exc_info=key_error)
-                except requests.exceptions.ConnectionError as conn_error:
-                    _LOGGER.error(f'Connection Error, retrying next update cycle', exc_info=conn_error)
-                except JSONDecodeError as json_error:
-                    _LOGGER.error(f'JSON Decode Error, retrying next update cycle', exc_info=json_error)
-            last_check[camera] = turn_on
-        time.sleep(UPDATE_FREQUENCY)
+        with heartbeat.cycle():
+            if event is PresenceEvents.ARRIVED:
+                # an arrival carries the latest check, disarm straight away without scanning again
+                anyone_home = location.is_anyone_home(cached=True)
+                confirmed = anyone_home
+            else:
+                anyone_home = location.is_anyone_home()
+                confirmed = False
+            for camera in cameras['device_names']:
+                turn_on = not anyone_home or scheduler.is_scheduled_on(camera)
+                if last_check[camera] == turn_on or confirmed:
+                    heartbeat.check()
+                    power_state = PowerStates.POWER_ON if turn_on else PowerStates.POWER_OFF
+                    try:
+                        home_assistant.set_power_state(camera, power_state)
+                    except KeyError as key_error:
+                        _LOGGER.error(f'Key Error, retrying next update cycle', exc_info=key_error)
+                    except requests.exceptions.ConnectionError as conn_error:
+                        _LOGGER.error(f'Connection Error, retrying next update cycle', exc_info=conn_error)
+                    except JSONDecodeError as json_error:
+                        _LOGGER.error(f'JSON Decode Error, retrying next update cycle', exc_info=json_error)
+                last_check[camera] = turn_on
+        heartbeat.check()
+        event = presence.wait(UPDATE_FREQUENCY)
+        if event is not None:
+            _LOGGER.info('Presence %s, updating cameras', event.value)
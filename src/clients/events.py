@@ -0,0 +1,58 @@
+from enum import Enum
+import logging
+import queue
+import threading
+from typing import Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PresenceEvents(Enum):
+    ARRIVED = 'arrived'
+    DEPARTED = 'departed'
+
+
+class Subscription:
+    """A subscriber's queue of events. Controllers wait on it in place of sleeping,
+    so they wake up as soon as an event is published."""
+
+    def __init__(self, topics: set):
+        self.topics = topics
+        self._queue = queue.Queue()
+
+    def put(self, event: Enum):
+        self._queue.put(event)
+
+    def wait(self, timeout: float) -> Optional[Enum]:
+        """Blocks until an event is published or the timeout expires, returns the event or None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """Simple in-process publish/subscribe bus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []
+
+    def subscribe(self, *topics: Enum) -> Subscription:
+        subscription = Subscription(set(topics))
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, event: Enum):
+        _LOGGER.debug('Publishing %s', event)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if event in subscription.topics:
+                subscription.put(event)
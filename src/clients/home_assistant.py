@@ -1,6 +1,8 @@
 from enum import Enum
 import logging
+from typing import Optional
 import requests
+from clients.response import EntityState, decode
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,25 +19,25 @@ class HomeAssistant:
     def __init__(self, access_token):
         self._access_token = access_token
 
-    def get_device_by_entity_id(self, entity_id: str) -> dict:
-        result = {}
+    def get_device_by_entity_id(self, entity_id: str) -> Optional[EntityState]:
+        result = None
         try:
             headers = {'Authorization': f'Bearer {self._access_token}', 'Accept': 'application/json'}
             response = requests.get(f'{HomeAssistant.BASE_URL}/states/{entity_id}', headers=headers)
         except requests.exceptions.RequestException as e:
             _LOGGER.warning(e)
         else:
-            if response.status_code == requests.codes.ok and response.json() is not None:
-                _LOGGER.debug(f'Got response for {entity_id}, {response.json()}')
-                result = response.json()
-            else:
-                _LOGGER.warning(f'Unable to fetch entity id, status_code = {response.status_code}')
+            data = decode(response, entity_id)
+            if data is not None:
+                result = EntityState.from_json(data)
         finally:
             return result
 
     def is_on(self, entity_id: str) -> bool:
         device = self.get_device_by_entity_id(entity_id)
-        return device['state'] == 'on'
+        if device is None:
+            raise KeyError(entity_id)
+        return device.is_on
 
     def set_power_state(self, entity_id: str, power_state: PowerStates, **kwargs):
         if power_state == PowerStates.POWER_ON and self.is_on(entity_id):
@@ -54,16 +56,12 @@ class HomeAssistant:
         service_type = entity_id.split('.')[0]
         try:
             headers = {'Authorization': f'Bearer {self._access_token}', 'Accept': 'application/json'}
-            _LOGGER.info(f'Setting {power_state.value} for {entity_id} with settings {kwargs}')
+            _LOGGER.info('Setting %s for %s with settings %s', power_state.value, entity_id, kwargs)
             response = requests.post(f'{HomeAssistant.BASE_URL}/services/{service_type}/{power_state.value}', json=payload, headers=headers)
         except requests.exceptions.RequestException as e:
             _LOGGER.warning(e)
         else:
-            if response.status_code == requests.codes.ok and response.json() is not None:
-                _LOGGER.debug(f'Got response for {entity_id}, {response.json()}')
-                return response.json()
-            else:
-                _LOGGER.warning(f'Unable to update entity id, status_code = {response.status_code}')
+            return decode(response, entity_id, action='update')
 
     # def set_color_temp(self, device: Device, temp: int):
     #     self.set_color(device, WyzeClient._get_rgb_from_color_temp(temp))
@@ -1,19 +1,23 @@
 import logging
 import platform
 import subprocess
+import threading
 from pushbullet import Pushbullet
+from clients.events import EventBus, PresenceEvents
 
 _LOGGER = logging.getLogger(__name__)
 
 class Location:
     MOCK_NMAP = 'F0:AA:BB:CC:DD:EE, F0:5C:77:FB:13:7F'
 
-    def __init__(self, pushbullet_key, retry_count, ip_range, phone_macs):
+    def __init__(self, pushbullet_key, retry_count, ip_range, phone_macs, event_bus: EventBus = None):
         self.PUSHBULLET_API_KEY = pushbullet_key
         self.RETRY_COUNT = retry_count
         self.ip_range = ip_range
         self.phone_macs = phone_macs
+        self.event_bus = event_bus
         self._last_check = True
+        self._last_check_lock = threading.Lock()
 
     def get_nmap(self) -> str:
         if 'macOS' in platform.platform():
@@ -31,16 +35,25 @@ class Location:
             for mac in self.phone_macs:
                 if mac in nmap_out:
                     if i == self.RETRY_COUNT - 1:
-                        _LOGGER.info(f'Someone is home, took {i} iterations to check')
+                        _LOGGER.info('Someone is home, took %d iterations to check', i)
                     else:
-                        _LOGGER.debug(f'Someone is home, took {i} iterations to check')
-                    self._last_check = True
-                    return self._last_check
+                        _LOGGER.debug('Someone is home, took %d iterations to check', i)
+                    self._set_last_check(True)
+                    return True
 
         if _LOGGER.isEnabledFor(logging.DEBUG):
             _LOGGER.debug('No one is home')
             pb = Pushbullet(self.PUSHBULLET_API_KEY)
             pb.push_note('Wyze', 'No one is home')
 
-        self._last_check = False
-        return self._last_check
\ No newline at end of file
+        self._set_last_check(False)
+        return False
+
+    def _set_last_check(self, is_home: bool):
+        """Stores the result of a presence check and publishes an event if it changed"""
+        with self._last_check_lock:
+            changed = self._last_check != is_home
+            self._last_check = is_home
+        if changed and self.event_bus is not None:
+            _LOGGER.info('Presence changed, %s', 'someone arrived home' if is_home else 'everyone left')
+            self.event_bus.publish(PresenceEvents.ARRIVED if is_home else PresenceEvents.DEPARTED)
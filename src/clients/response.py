@@ -0,0 +1,79 @@
+import json
+import logging
+from typing import Any, Optional
+import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def loads(body: bytes) -> Any:
+    """Decodes a JSON body, using orjson when it is installed.
+    Both decoders raise json.decoder.JSONDecodeError on bad input."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def decode(response: requests.Response, name: str, action: str = 'fetch') -> Optional[Any]:
+    """Decodes the body of a successful response exactly once. Returns None and logs a warning
+    if the request was not successful or the body is empty."""
+    if response.status_code != requests.codes.ok:
+        _LOGGER.warning('Unable to %s %s, status_code = %s', action, name, response.status_code)
+        return None
+
+    data = loads(response.content) if response.content else None
+    if data is None:
+        _LOGGER.warning('Unable to %s %s, empty response', action, name)
+        return None
+
+    _LOGGER.debug('Got response for %s, %s', name, data)
+    return data
+
+
+class EntityState:
+    """State of a single Home Assistant entity, as returned by /api/states/<entity_id>"""
+    __slots__ = ('entity_id', 'state', 'attributes', 'last_changed', 'last_updated')
+
+    def __init__(self, entity_id: str, state: str, attributes: dict, last_changed: str, last_updated: str):
+        self.entity_id = entity_id
+        self.state = state
+        self.attributes = attributes
+        self.last_changed = last_changed
+        self.last_updated = last_updated
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'EntityState':
+        return cls(data['entity_id'], data['state'], data.get('attributes', {}),
+                   data.get('last_changed'), data.get('last_updated'))
+
+    @property
+    def is_on(self) -> bool:
+        return self.state == 'on'
+
+    def __repr__(self):
+        return f'<EntityState: {self.entity_id}, {self.state}>'
+
+
+class WeatherData:
+    """The parts of an OpenWeatherMap current weather response used by the lights"""
+    __slots__ = ('dt', 'description', 'cloud_coverage', 'sunrise', 'sunset')
+
+    def __init__(self, dt: int, description: str, cloud_coverage: int, sunrise: int, sunset: int):
+        self.dt = dt
+        self.description = description
+        self.cloud_coverage = cloud_coverage
+        self.sunrise = sunrise
+        self.sunset = sunset
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'WeatherData':
+        return cls(data['dt'], data['weather'][0]['description'].lower(), data['clouds']['all'],
+                   data['sys']['sunrise'], data['sys']['sunset'])
+
+    def __repr__(self):
+        return f'<WeatherData: {self.description}, {self.cloud_coverage}% clouds>'
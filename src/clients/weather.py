@@ -1,6 +1,7 @@
 import time
 import logging
 import requests
+from clients.response import WeatherData, decode
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,16 +30,15 @@ class OpenWeatherMap():
         except requests.exceptions.RequestException as e:
             _LOGGER.warning(e)
         else:
-            if response.status_code == requests.codes.ok and response.json() is not None:
-                self.weather_data = response.json()
+            data = decode(response, 'weather data')
+            if data is not None:
+                self.weather_data = WeatherData.from_json(data)
                 _LOGGER.info('Weather data updated')
-            else:
-                _LOGGER.warning(f'Unable to fetch weather data, status_code = {response.status_code}')
 
     def _time_check(self) -> bool:
         """Test if update interval has been exceeded."""
         if self.weather_data is None or (
-                time.time() > (self.weather_data['dt'] + self.update_interval)):
+                time.time() > (self.weather_data.dt + self.update_interval)):
             return True
         return False
 
@@ -56,12 +56,12 @@ class OpenWeatherMap():
     @property
     def weather_description(self) -> str:
         self._update_weather_data()
-        return self.weather_data['weather'][0]['description'].lower()
+        return self.weather_data.description
 
     @property
     def cloud_coverage(self) -> int:
         self._update_weather_data()
-        return self.weather_data['clouds']['all']
+        return self.weather_data.cloud_coverage
 
     @property
     def is_sun_up(self) -> bool:
@@ -71,8 +71,8 @@ class OpenWeatherMap():
         """With no params this method checks if the sun is up. Optional offsets can be provided to check a custom range.
         Offset values are in seconds."""
         self._update_weather_data()
-        if time.time() > self.weather_data['sys']['sunrise'] - rise_offset \
-            and time.time() < self.weather_data['sys']['sunset'] + set_offset:
+        if time.time() > self.weather_data.sunrise - rise_offset \
+            and time.time() < self.weather_data.sunset + set_offset:
                 return True
 
         return False
@@ -1,15 +1,19 @@
 import datetime
+import heapq
 from json.decoder import JSONDecodeError
 import time
 import logging
 from random import randint
+from typing import Optional
 import requests
 from pyvesync.vesyncbasedevice import VeSyncBaseDevice
 from pyvesync.vesyncoutlet import VeSyncOutlet
+from clients.events import EventBus, PresenceEvents, Subscription
 from clients.location import Location
 from clients.vesync import SmartVeSync
 from clients.weather import OpenWeatherMap
 from clients.home_assistant import HomeAssistant, PowerStates
+from supervisor import Heartbeat
 
 _LOGGER = logging.getLogger(__name__)
 MIN_BRIGHTNESS = 30
@@ -53,10 +57,10 @@ class Runtime:
                 if self.is_max_time_exceeded(times):
                     cycle_state(outlet_vesync)
                     times['start'] = 0
-                    _LOGGER.info(f'{outlet} run time exceeded')
+                    _LOGGER.info('%s run time exceeded', outlet)
                 elif times['start'] == 0:
                     times['start'] = time.time()
-                    _LOGGER.info(f'{outlet} turned on')
+                    _LOGGER.info('%s turned on', outlet)
 
     def is_max_time_exceeded(self, times: dict) -> bool:
         return times['start'] > 0 and time.time() - times['start'] > times['max_time']
@@ -70,36 +74,74 @@ class AwayAutoOff:
         self.new_day_time = datetime.time(hour=int(new_day_time.split(':')[0]), minute=int(new_day_time.split(':')[1]))
         self.vesync_manager = vesync_manager
         self._config = {}
+        self._heap = []
+        self._enforced = {}
 
     def _vary_time(self, time: datetime.time) -> time:
         date = datetime.datetime(1970, 1, 1, time.hour, time.minute, time.second, tzinfo=datetime.timezone.utc)
         delta = datetime.timedelta(seconds=randint(-self.time_variance, self.time_variance))
         return (date + delta).time()
 
+    def _day_start(self, now: datetime.datetime) -> datetime.datetime:
+        """Returns the start of the schedule day containing now, days roll over at new_day_time"""
+        start = datetime.datetime.combine(now.date(), self.new_day_time)
+        if start > now:
+            start -= datetime.timedelta(days=1)
+        return start
+
+    def _schedule(self, lamp: str, day_start: datetime.datetime) -> None:
+        """Pushes the lamp's randomised off time for the schedule day starting at day_start onto the heap"""
+        actual_off_time = self._vary_time(self._config[lamp]['off_time'])
+        off_at = datetime.datetime.combine(day_start.date(), actual_off_time)
+        if off_at < day_start:
+            off_at += datetime.timedelta(days=1)
+        self._config[lamp]['actual_off_time'] = actual_off_time
+        self._config[lamp]['off_at'] = off_at
+        heapq.heappush(self._heap, (off_at, lamp))
+
     def add(self, lamp: str, off_time: str):
         """Adds a lamp to the away auto off scheduler, or updates the off time if it already exists"""
         if lamp is None or off_time is None:
             raise TypeError('Both args must be set and not None')
-        if lamp not in self._config:
-            self._config[lamp] = {'off_time': None, 'actual_off_time': None}
+        if lamp in self._config:
+            self._heap = [entry for entry in self._heap if entry[1] != lamp]
+            heapq.heapify(self._heap)
+            self._enforced.pop(lamp, None)
         off_time = datetime.time(hour=int(off_time.split(':')[0]), minute=int(off_time.split(':')[1]))
-        self._config[lamp]['off_time'] = off_time
-        self._config[lamp]['actual_off_time'] = self._vary_time(off_time)
-        _LOGGER.info(f"added {lamp} to away auto off, {self._config[lamp]}")
+        self._config[lamp] = {'off_time': off_time, 'actual_off_time': None, 'off_at': None}
+        self._schedule(lamp, self._day_start(datetime.datetime.now()))
+        _LOGGER.info('added %s to away auto off, %s', lamp, self._config[lamp])
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Returns the number of seconds until the next lamp is due, 0 if one is already due,
+        or None if no lamp is waiting for its off time"""
+        if not self._heap:
+            return None
+        return max(0.0, (self._heap[0][0] - datetime.datetime.now()).total_seconds())
 
     def check(self) -> None:
-        """Checks all configured lamps against their off time, only call in away mode"""
-        now = datetime.datetime.now().time()
-        for lamp, times in self._config.items():
-            outlet_vesync = self.vesync_manager.get_device_by_name(lamp)
-            if not outlet_vesync.is_on:
+        """Turns off lamps whose off time has passed, only call in away mode.
+        An off time stays in force until the next new_day_time, lamps that are not due yet are not touched."""
+        now = datetime.datetime.now()
+        day_start = self._day_start(now)
+        for lamp, until in list(self._enforced.items()):
+            if until <= now:
+                del self._enforced[lamp]
+                self._schedule(lamp, day_start)
+        while self._heap and self._heap[0][0] <= now:
+            off_at, lamp = heapq.heappop(self._heap)
+            if off_at < day_start:
+                # the off time belongs to a previous day that was never checked (e.g. someone was home),
+                # so pick a fresh off time for today rather than acting on a stale one
+                self._schedule(lamp, day_start)
                 continue
-            assert times['off_time'] is not None and times['actual_off_time'] is not None
-            if (times['actual_off_time'] > self.new_day_time and times['actual_off_time'] < now) or \
-               (times['actual_off_time'] < now and self.new_day_time > now):
+            self._enforced[lamp] = day_start + datetime.timedelta(days=1)
+
+        for lamp in self._enforced:
+            outlet_vesync = self.vesync_manager.get_device_by_name(lamp)
+            if outlet_vesync.is_on:
                 outlet_vesync.turn_off()
-                _LOGGER.info(f'turned off {lamp} as per away auto off schedule')
-                times['actual_off_time'] = self._vary_time(times['actual_off_time'])
+                _LOGGER.info('turned off %s as per away auto off schedule', lamp)
 
 
 class Lights:
@@ -116,11 +158,11 @@ class Lights:
         lamp_vesync = self.vesync_manager.get_device_by_name(lamp)
         if is_connected(sensor_vesync) and not lamp_vesync.is_on and self.check_ambient(lamp):
             lamp_vesync.turn_on()
-            _LOGGER.info(f'turned on {lamp_vesync.device_name}')
+            _LOGGER.info('turned on %s', lamp_vesync.device_name)
 
         if not is_connected(sensor_vesync) and lamp_vesync.is_on:
             lamp_vesync.turn_off()
-            _LOGGER.info(f'turned off {lamp_vesync.device_name}')
+            _LOGGER.info('turned off %s', lamp_vesync.device_name)
 
     def check_sensor_power(self, sensor: str, lamp: str):
         sensor_vesync = self.vesync_manager.get_device_by_name(sensor)
@@ -129,20 +171,20 @@ class Lights:
             lamp_vesync.turn_on()
         if not is_connected(sensor_vesync) and lamp_vesync.power > 2:
             cycle_state(lamp_vesync)
-            _LOGGER.info(f'turned off {lamp_vesync.device_name}')
+            _LOGGER.info('turned off %s', lamp_vesync.device_name)
 
     def check_sensor_wyze(self, sensor: str, bulb: str):
         sensor_vesync = self.vesync_manager.get_device_by_name(sensor)
         # bulb_wyze = self.home_assistant.get_device_by_entity_id(bulb)
         if is_connected(sensor_vesync) and not self.home_assistant.is_on(bulb):
             self.configure_wyze_bulb(bulb)
-            _LOGGER.info(f'turned on {bulb}')
+            _LOGGER.info('turned on %s', bulb)
 
         if not is_connected(sensor_vesync) and self.home_assistant.is_on(bulb):
             self.home_assistant.run_action(bulb, PowerStates.POWER_OFF)
             # self.wyze_client.set_brightness(bulb_wyze, MIN_BRIGHTNESS)
             # self.wyze_client.turn_off(bulb_wyze)
-            _LOGGER.info(f'turned off {bulb}')
+            _LOGGER.info('turned off %s', bulb)
 
     def check_ambient(self, lamp: str) -> bool:
         if lamp not in self.check_ambient_enabled:
@@ -152,7 +194,7 @@ class Lights:
         #         f"it is cloudy ({self.weather_client.weather_description} with cloud coverage {self.weather_client.cloud_coverage}%), {lamp} not turing on")
         #     return False
         if not self.weather_client.is_sun_up:
-            _LOGGER.debug(f"it is dark, {lamp} not turing on")
+            _LOGGER.debug('it is dark, %s not turing on', lamp)
             return False
         return True
 
@@ -227,10 +269,20 @@ def cycle_state(outlet: VeSyncOutlet) -> None:
 # return device
 # raise TypeError(f'Type {type(device)} is unsupported')
 
-def main(config: dict, home_assistant: HomeAssistant, location: Location):
+class LightsState:
+    """Authenticated clients and schedulers for the lights controller, reused when it is restarted"""
+
+    def __init__(self, vesync_manager: SmartVeSync, lights: Lights, runtime: Runtime, away_auto_off: AwayAutoOff,
+                 presence: Subscription) -> None:
+        self.vesync_manager = vesync_manager
+        self.lights = lights
+        self.runtime = runtime
+        self.away_auto_off = away_auto_off
+        self.presence = presence
+
+
+def setup(config: dict, home_assistant: HomeAssistant, event_bus: EventBus) -> LightsState:
     lights_config = config['lights']
-    HOME_UPDATE_FREQUENCY = lights_config['update_frequency']['home']
-    AWAY_UPDATE_FREQUENCY = lights_config['update_frequency']['away']
 
     # figure out which vesync devices require details
     update_details = []
@@ -242,7 +294,7 @@ def main(config: dict, home_assistant: HomeAssistant, location: Location):
 
     vesync = config['vesync']
     vesync_manager = SmartVeSync(vesync['username'], vesync['password'], vesync['time_zone'], update_details)
-    vesync_manager.update_interval = HOME_UPDATE_FREQUENCY
+    vesync_manager.update_interval = lights_config['update_frequency']['home']
     vesync_manager.login()
     vesync_manager.update()
     _LOGGER.info('VeSync devices updated')
@@ -261,34 +313,67 @@ def main(config: dict, home_assistant: HomeAssistant, location: Location):
     for key, val in away_config['devices'].items():
         away_auto_off.add(key, val)
 
+    presence = event_bus.subscribe(PresenceEvents.ARRIVED, PresenceEvents.DEPARTED)
+    return LightsState(vesync_manager, lights, runtime, away_auto_off, presence)
+
+
+def run(config: dict, location: Location, state: LightsState, heartbeat: Heartbeat):
+    lights_config = config['lights']
+    HOME_UPDATE_FREQUENCY = lights_config['update_frequency']['home']
+    AWAY_UPDATE_FREQUENCY = lights_config['update_frequency']['away']
+    lights = state.lights
+    runtime = state.runtime
+    away_auto_off = state.away_auto_off
+    presence = state.presence
+
+    event = None
     while True:
-        try:
-            # lights.check_sensor(Devices.OFFICE_SENSOR, Devices.OFFICE_LAMP)
-            for sensor, light in lights_config['method_device_mapping']['vesync-vesync_state'].items():
-                lights.check_sensor(sensor, light)
-
-            # lights.check_sensor_power(Devices.NURSERY_SENSOR, Devices.NURSERY_FEEDING_LAMP)
-            for sensor, light in lights_config['method_device_mapping']['vesync-vesync_power'].items():
-                lights.check_sensor_power(sensor, light)
-
-            # lights.check_sensor_wyze(Devices.NURSERY_SENSOR, Devices.NURSERY_BULB)
-            for sensor, light in lights_config['method_device_mapping']['vesync-wyze_state'].items():
-                lights.check_sensor_wyze(sensor, light)
-
-            runtime.check()
-            if not location.is_anyone_home(cached=True) and not location.is_anyone_home():
-                away_auto_off.check()
-        except KeyError as key_error:
-            _LOGGER.error(f'Key Error, retrying after a delay', exc_info=key_error)
-            time.sleep(AWAY_UPDATE_FREQUENCY)
-        except requests.exceptions.ConnectionError as conn_error:
-            _LOGGER.error(f'Connection Error, retrying after a delay', exc_info=conn_error)
-            time.sleep(AWAY_UPDATE_FREQUENCY)
-        except JSONDecodeError as json_error:
-            _LOGGER.error(f'JSON Decode Error, retrying after a delay', exc_info=json_error)
+        retry_delay = False
+        with heartbeat.cycle():
+            try:
+                # lights.check_sensor(Devices.OFFICE_SENSOR, Devices.OFFICE_LAMP)
+                for sensor, light in lights_config['method_device_mapping']['vesync-vesync_state'].items():
+                    heartbeat.check()
+                    lights.check_sensor(sensor, light)
+
+                # lights.check_sensor_power(Devices.NURSERY_SENSOR, Devices.NURSERY_FEEDING_LAMP)
+                for sensor, light in lights_config['method_device_mapping']['vesync-vesync_power'].items():
+                    heartbeat.check()
+                    lights.check_sensor_power(sensor, light)
+
+                # lights.check_sensor_wyze(Devices.NURSERY_SENSOR, Devices.NURSERY_BULB)
+                for sensor, light in lights_config['method_device_mapping']['vesync-wyze_state'].items():
+                    heartbeat.check()
+                    lights.check_sensor_wyze(sensor, light)
+
+                heartbeat.check()
+                runtime.check()
+                # a presence event carries the latest check, only scan again on a regular update cycle
+                if not location.is_anyone_home(cached=True) and (event is not None or not location.is_anyone_home()):
+                    heartbeat.check()
+                    away_auto_off.check()
+            except KeyError as key_error:
+                _LOGGER.error(f'Key Error, retrying after a delay', exc_info=key_error)
+                retry_delay = True
+            except requests.exceptions.ConnectionError as conn_error:
+                _LOGGER.error(f'Connection Error, retrying after a delay', exc_info=conn_error)
+                retry_delay = True
+            except JSONDecodeError as json_error:
+                _LOGGER.error(f'JSON Decode Error, retrying after a delay', exc_info=json_error)
+                retry_delay = True
+            # except UnknownApiError as unknown_api_error:
+            #     _LOGGER.error(f'Unknown Wyze API Error, retrying after a delay', exc_info=unknown_api_error)
+            #     retry_delay = True
+
+        # back off outside the cycle so a retry delay is not reported as cycle latency
+        if retry_delay:
             time.sleep(AWAY_UPDATE_FREQUENCY)
-        # except UnknownApiError as unknown_api_error:
-        #     _LOGGER.error(f'Unknown Wyze API Error, retrying after a delay', exc_info=unknown_api_error)
-        #     time.sleep(AWAY_UPDATE_FREQUENCY)
-
-        time.sleep(HOME_UPDATE_FREQUENCY if location.is_anyone_home(cached=True) else AWAY_UPDATE_FREQUENCY)
+        heartbeat.check()
+        if location.is_anyone_home(cached=True):
+            event = presence.wait(HOME_UPDATE_FREQUENCY)
+        else:
+            # wake up early if a lamp is due to be turned off before the next away cycle
+            next_off = away_auto_off.seconds_until_next()
+            event = presence.wait(AWAY_UPDATE_FREQUENCY if next_off is None else min(AWAY_UPDATE_FREQUENCY, next_off))
+        if event is not None:
+            _LOGGER.info('Presence %s, updating lights', event.value)
@@ -1,5 +1,5 @@
 import re
-import threading
+from functools import partial
 from os import path
 import logging
 from typing import Any
@@ -11,8 +11,10 @@ logging.basicConfig(
 from ruamel.yaml import YAML
 
 import cameras, lights
+from clients.events import EventBus
 from clients.location import Location
 from clients.home_assistant import HomeAssistant
+from supervisor import Supervisor
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,6 +49,10 @@ def check_numeric(config) -> dict:
         for k, v in config['runtime'].items():
             config['runtime'][k] = eval_numeric(v)
 
+    if config.get('supervisor') is not None:
+        sup = config['supervisor']
+        sup['stall_grace'] = eval_numeric(sup.get('stall_grace', 5 * 60))
+
 
 def load_config() -> dict:
     yaml = YAML(typ='safe')
@@ -65,16 +71,22 @@ def main():
     home_assistant = HomeAssistant(config['home_assistant']['access_token'])
     _LOGGER.info('Home Assistant configured')
 
+    event_bus = EventBus()
     loc = config['location']
-    location = Location(config['pushbullet']['api_key'], loc['retry_count'], loc['ip_range'], loc['phone_macs'])
-
-    _LOGGER.info('Starting lights thread...')
-    threading.Thread(target=lights.main, args=(config, home_assistant, location,)).start()
+    location = Location(config['pushbullet']['api_key'], loc['retry_count'], loc['ip_range'], loc['phone_macs'],
+                        event_bus)
 
-    _LOGGER.info('Starting cameras thread...')
-    threading.Thread(target=cameras.main, args=(config, home_assistant, location,)).start()
-
-    _LOGGER.info('Both threads started')
+    sup = config.get('supervisor') or {}
+    stall_grace = sup.get('stall_grace', 5 * 60)
+    supervisor = Supervisor(sup.get('health_port', 8765))
+    # a controller is stalled once it misses a heartbeat for twice its longest sleep plus a grace period
+    l_up = config['lights']['update_frequency']
+    supervisor.add('lights', partial(lights.setup, config, home_assistant, event_bus),
+                   partial(lights.run, config, location), 2 * max(l_up['home'], l_up['away']) + stall_grace)
+    supervisor.add('cameras', partial(cameras.setup, config, event_bus),
+                   partial(cameras.run, config, home_assistant, location),
+                   2 * config['cameras']['update_frequency'] + stall_grace)
+    supervisor.run()
 
 
 if __name__ == "__main__":
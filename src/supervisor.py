@@ -0,0 +1,205 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Superseded(Exception):
+    """Raised in a controller thread that was replaced by a restart"""
+
+
+class Heartbeat:
+    """Handed to a controller's run function, which wraps each update cycle in cycle() and calls check()
+    before each step that touches shared state, so a superseded thread stops at the next step"""
+
+    def __init__(self, controller: 'Controller', generation: int):
+        self._controller = controller
+        self._generation = generation
+
+    def check(self):
+        """Raises Superseded if the controller was restarted since this thread started"""
+        if self._generation != self._controller.generation:
+            raise Superseded(self._controller.name)
+
+    @contextmanager
+    def cycle(self):
+        self.check()
+        start = time.monotonic()
+        yield
+        # a stalled thread can return from a blocked call after its replacement started, it must not
+        # report a heartbeat for the new thread or carry on sharing its state
+        self.check()
+        self._controller.beat(self._generation, time.monotonic() - start)
+
+
+class Controller:
+    """A supervised controller. setup() builds the authenticated clients and caches once, run(state, heartbeat)
+    loops forever. A restart calls run() again with the same state, setup() is only retried if it failed."""
+
+    def __init__(self, name: str, setup: Callable[[], Any], run: Callable[[Any, Heartbeat], None],
+                 stall_timeout: float):
+        self.name = name
+        self._setup = setup
+        self._run = run
+        self.stall_timeout = stall_timeout
+        self.state = None
+        self.generation = 0
+        self.restarts = 0
+        self.failures = 0
+        self.last_error = None
+        # the health endpoint can be queried before start(), so heartbeat_age must always be defined
+        self.last_heartbeat = time.monotonic()
+        self.cycle_latency = None
+        self._thread = None
+
+    def start(self):
+        self.generation += 1
+        self.last_heartbeat = time.monotonic()
+        self._thread = threading.Thread(target=self._target, args=(self.generation,), name=self.name, daemon=True)
+        self._thread.start()
+
+    def restart(self, reason: str):
+        self.restarts += 1
+        self.failures += 1
+        _LOGGER.warning('Restarting %s (%s), restart %d', self.name, reason, self.restarts)
+        self.start()
+
+    def beat(self, generation: int, latency: float):
+        if generation != self.generation:
+            return
+        self.last_heartbeat = time.monotonic()
+        self.cycle_latency = latency
+        self.failures = 0
+
+    def _target(self, generation: int):
+        try:
+            if self.state is None:
+                state = self._setup()
+                if generation != self.generation:
+                    raise Superseded(self.name)
+                self.state = state
+                self.last_heartbeat = time.monotonic()
+                _LOGGER.info('%s set up', self.name)
+            self._run(self.state, Heartbeat(self, generation))
+        except Superseded:
+            _LOGGER.info('Stale %s thread exited', self.name)
+        except Exception as error:
+            _LOGGER.error('%s crashed', self.name, exc_info=error)
+            if generation == self.generation:
+                self.last_error = repr(error)
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def heartbeat_age(self) -> float:
+        return time.monotonic() - self.last_heartbeat
+
+    @property
+    def is_stalled(self) -> bool:
+        return self.heartbeat_age > self.stall_timeout
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state is not None and self.cycle_latency is not None and self.is_alive and not self.is_stalled
+
+    def status(self) -> dict:
+        return {
+            'alive': self.is_alive,
+            'ready': self.is_ready,
+            'heartbeat_age': round(self.heartbeat_age, 3),
+            'cycle_latency': None if self.cycle_latency is None else round(self.cycle_latency, 3),
+            'restarts': self.restarts,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+class Supervisor:
+    """Starts the controllers, restarts any that crash or stop sending heartbeats, and serves
+    liveness (/health/live) and readiness (/health/ready) on a local port"""
+
+    CHECK_INTERVAL = 5
+    MIN_RESTART_INTERVAL = 30
+    MAX_RESTART_INTERVAL = 30 * 60
+
+    def __init__(self, health_port: int):
+        self.health_port = health_port
+        self.controllers = []
+        self._last_check = None
+
+    def add(self, name: str, setup: Callable[[], Any], run: Callable[[Any, Heartbeat], None], stall_timeout: float):
+        self.controllers.append(Controller(name, setup, run, stall_timeout))
+
+    @property
+    def is_live(self) -> bool:
+        return self._last_check is not None and time.monotonic() - self._last_check < 3 * Supervisor.CHECK_INTERVAL
+
+    @property
+    def is_ready(self) -> bool:
+        return self.is_live and all(controller.is_ready for controller in self.controllers)
+
+    def status(self) -> dict:
+        return {controller.name: controller.status() for controller in self.controllers}
+
+    @staticmethod
+    def restart_interval(controller: Controller) -> float:
+        """Doubles for every restart that has not been followed by a successful cycle, up to MAX_RESTART_INTERVAL"""
+        return min(Supervisor.MIN_RESTART_INTERVAL * 2 ** min(controller.failures, 16), Supervisor.MAX_RESTART_INTERVAL)
+
+    def check(self):
+        """Restarts crashed or stalled controllers, backing off while restarts keep failing"""
+        self._last_check = time.monotonic()
+        for controller in self.controllers:
+            if controller.is_alive and not controller.is_stalled:
+                continue
+            if controller.heartbeat_age < Supervisor.restart_interval(controller):
+                continue
+            controller.restart('crashed' if not controller.is_alive else 'stalled')
+
+    def run(self):
+        """Starts the health endpoint and all controllers, then watches them forever"""
+        self._start_health_server()
+        for controller in self.controllers:
+            _LOGGER.info('Starting %s thread...', controller.name)
+            controller.start()
+        while True:
+            self.check()
+            time.sleep(Supervisor.CHECK_INTERVAL)
+
+    def _start_health_server(self):
+        supervisor = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health/live':
+                    ok = supervisor.is_live
+                elif self.path == '/health/ready':
+                    ok = supervisor.is_ready
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps({'ok': ok, 'controllers': supervisor.status()}).encode('utf-8')
+                self.send_response(200 if ok else 503)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                _LOGGER.debug(format, *args)
+
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', self.health_port), HealthHandler)
+        except OSError as error:
+            # the controllers matter more than the health endpoint, keep going without it
+            _LOGGER.error('Unable to start health endpoint on port %d', self.health_port, exc_info=error)
+            return
+        threading.Thread(target=server.serve_forever, name='health', daemon=True).start()
+        _LOGGER.info('Health endpoint listening on port %d', self.health_port)